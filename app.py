@@ -1,15 +1,20 @@
-from flask import Flask, render_template, redirect, url_for, request, flash
+from flask import Flask, render_template, redirect, url_for, request, flash, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
-from models import db, User, Course, Submission, Assignment
+from models import db, User, Course, Submission, Assignment, Blob, stored_submissions
 import logic  # Importing your FAISS version
+import storage
 import datetime
+import click
 import os
+from werkzeug.utils import safe_join
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-key-123'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///university.db'
+# Legacy flat folder; new files go to the content-addressed BLOB_FOLDER
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static/uploads')
+app.config['BLOB_FOLDER'] = os.path.join(app.root_path, 'blobs')
 
 # Ensure upload directory exists
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -143,10 +148,10 @@ def create_assignment(course_id):
         
         for file in files:
             if file and file.filename != '':
-                timestamp = int(datetime.datetime.now().timestamp())
-                secure_name = f"Q_{course_id}_{timestamp}_{file.filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], secure_name))
-                filenames.append(secure_name)
+                digest, size = storage.save_upload(file.stream)
+                storage.retain(digest, size)
+                # ',' separates entries in question_file
+                filenames.append(f"{digest}:{file.filename.replace(',', '_')}")
 
         new_assign = Assignment(
             title=title,
@@ -192,21 +197,20 @@ def submit(assignment_id):
     if request.method == 'POST':
         file = request.files.get('file') 
         if file:
-            filename = f"S_{assignment_id}_{current_user.id}_{int(datetime.datetime.now().timestamp())}_{file.filename}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
-            # 1. Extract Text and Hash using advanced Logic
-            # Note: logic.extract_text handles OCR and PDF automatically now
-            extracted_text, binary_content, file_hash = logic.extract_text(file_path)
+            filename = file.filename
+            # 1. Store and Hash in one pass, then Extract Text
+            # Note: logic.extract_file_text handles OCR and PDF automatically now
+            digest, size = storage.save_upload(file.stream)
+            extracted_text = logic.extract_file_text(storage.blob_path(digest), filename)
             
             if not extracted_text or len(extracted_text) < 10:
+                # The unreferenced blob is left for `flask sweep-uploads`
                 flash("Could not read file. Ensure it is not an empty or blurry image.", "warning")
                 return redirect(request.url)
 
             # 2. Check for EXACT duplicate hash (Fastest)
             existing_duplicate = Submission.query.filter_by(
-                content_hash=file_hash, 
+                content_hash=digest, 
                 course_id=assignment.course_id
             ).filter(Submission.user_id != current_user.id).first()
 
@@ -249,13 +253,16 @@ def submit(assignment_id):
                 course_id=assignment.course_id,
                 filename=filename,
                 text_content=extracted_text, # Save text for next comparisons
-                content_hash=file_hash,
+                content_hash=digest,
                 score=max_score,
                 status=final_status,
                 reason=reason,
                 timestamp=datetime.datetime.now()
             )
             db.session.add(new_sub)
+            db.session.flush()
+            storage.retain(digest, size)
+            db.session.execute(stored_submissions.insert().values(submission_id=new_sub.id))
             db.session.commit()
             
             # 6. REBUILD FAISS INDEX with the new text
@@ -266,6 +273,44 @@ def submit(assignment_id):
 
     return render_template('upload.html', assignment=assignment, attempts_made=attempts_made)
 
+# --- FILE DOWNLOADS ---
+
+@app.route('/files/submission/<int:submission_id>')
+@login_required
+def download_submission(submission_id):
+    sub = db.get_or_404(Submission, submission_id)
+    is_owner = sub.user_id == current_user.id
+    is_course_faculty = current_user.role == 'faculty' and sub.assignment.course.faculty_id == current_user.id
+    if not (is_owner or is_course_faculty):
+        flash("You cannot download this submission.", "danger")
+        return redirect(url_for('dashboard'))
+
+    # Legacy rows hashed their file with SHA-256 too, so a matching Blob holds the same bytes
+    if sub.content_hash and db.session.get(Blob, sub.content_hash):
+        return storage.send_blob(sub.content_hash, sub.filename)
+    return send_from_directory(app.config['UPLOAD_FOLDER'], sub.filename, as_attachment=True)
+
+@app.route('/files/assignment/<int:assignment_id>/<int:index>')
+@login_required
+def download_question(assignment_id, index):
+    assign = db.get_or_404(Assignment, assignment_id)
+    if current_user.role == 'faculty':
+        allowed = assign.course.faculty_id == current_user.id
+    else:
+        allowed = assign.is_published and assign.course in current_user.enrolled_courses
+    if not allowed:
+        flash("You cannot download files for this assignment.", "danger")
+        return redirect(url_for('dashboard'))
+
+    files = assign.question_files
+    if index >= len(files):
+        return redirect(url_for('course_page', course_id=assign.course_id))
+
+    digest, name = files[index]
+    if digest:
+        return storage.send_blob(digest, name)
+    return send_from_directory(app.config['UPLOAD_FOLDER'], name, as_attachment=True)
+
 # --- REPORTS & PUBLISHING ---
 
 @app.route('/course/<int:course_id>/reports')
@@ -292,6 +337,70 @@ def toggle_publish(assignment_id):
     flash(f"Status updated to {'Published' if assign.is_published else 'Hidden'}", "info")
     return redirect(url_for('view_reports', course_id=assign.course_id))
 
+# --- STORAGE MAINTENANCE (flask <command>) ---
+
+@app.cli.command('archive-uploads')
+@click.option('--before', required=True, help="Compress files unused since this date (YYYY-MM-DD).")
+def archive_uploads(before):
+    """Moves past-term uploads to the gzip cold tier."""
+    cutoff = datetime.datetime.strptime(before, '%Y-%m-%d')
+    print(f"Archived {storage.archive(cutoff)} files to the cold tier.")
+
+@app.cli.command('sweep-uploads')
+def sweep_uploads():
+    """Deletes stored files that no Submission or Assignment references."""
+    print(f"Removed {storage.sweep()} unreferenced files.")
+
+@app.cli.command('import-uploads')
+def import_uploads():
+    """Moves legacy UPLOAD_FOLDER files into the deduplicated blob store."""
+    folder = app.config['UPLOAD_FOLDER']
+    imported = set()
+
+    def ingest(name):
+        path = safe_join(folder, name) if name else None
+        if not path or not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            digest, size = storage.save_upload(f)
+        storage.retain(digest, size)
+        imported.add(path)
+        return digest
+
+    # Only rows without a stored_submissions entry predate the blob store
+    stored = {row.submission_id for row in db.session.execute(stored_submissions.select())}
+
+    for sub in Submission.query.filter(Submission.id.notin_(stored)).all():
+        digest = ingest(sub.filename)
+        if digest is None:
+            # Flat file gone, but the same bytes were uploaded again since
+            blob = db.session.get(Blob, sub.content_hash) if sub.content_hash else None
+            if blob is None:
+                continue
+            digest = blob.hash
+            storage.retain(digest, blob.size)
+
+        sub.content_hash = digest
+        sub.filename = sub.filename.split('_', 4)[-1]  # S_<assignment>_<user>_<ts>_<name>
+        db.session.execute(stored_submissions.insert().values(submission_id=sub.id))
+
+    for assign in Assignment.query.filter(Assignment.question_file.isnot(None)).all():
+        entries = []
+        for (digest, name), label in zip(assign.question_files, assign.question_file_labels):
+            if digest is None:
+                digest = ingest(name)
+                if digest:
+                    name = label
+            entries.append(f"{digest}:{name}" if digest else name)
+        assign.question_file = ",".join(entries)
+
+    db.session.commit()
+
+    # Flat copies are only dropped once the references above are committed
+    for path in imported:
+        os.remove(path)
+    print(f"Imported {len(imported)} legacy files into the blob store.")
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
@@ -203,14 +203,13 @@ def extract_pdf_text(path):
 # -------------------------------------------------
 # MAIN EXTRACTION
 # -------------------------------------------------
-def extract_text(file_path):
-
-    with open(file_path, "rb") as f:
-        content = f.read()
-
-    file_hash = generate_hash(content)
+def extract_file_text(file_path, filename):
+    """
+    filename picks the extractor, since blob store paths are bare
+    SHA-256 digests without an extension.
+    """
 
-    name = file_path.lower()
+    name = filename.lower()
     text = ""
 
     if name.endswith(".txt"):
@@ -222,7 +221,7 @@ def extract_text(file_path):
     elif name.endswith((".png", ".jpg", ".jpeg")):
         text = extract_image_text(file_path)
 
-    return clean_text(text), content, file_hash
+    return clean_text(text)
 
 
 # -------------------------------------------------
@@ -10,6 +10,11 @@ enrollments = db.Table('enrollments',
     db.Column('course_id', db.Integer, db.ForeignKey('course.id'), primary_key=True)
 )
 
+# Submissions holding a Blob reference; rows missing here predate the blob store
+stored_submissions = db.Table('stored_submissions',
+    db.Column('submission_id', db.Integer, db.ForeignKey('submission.id'), primary_key=True)
+)
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -35,17 +40,38 @@ class Assignment(db.Model):
     instructions = db.Column(db.Text)
     deadline = db.Column(db.DateTime, nullable=False) 
     attempt_limit = db.Column(db.Integer, default=3)
-    question_file = db.Column(db.String(255), nullable=True) 
+    # Comma-separated "<sha256>:<original name>" references into the blob store
+    question_file = db.Column(db.Text, nullable=True) 
     is_published = db.Column(db.Boolean, default=True) 
     
     submissions = db.relationship('Submission', backref='assignment', lazy=True)
 
+    @property
+    def question_files(self):
+        """(digest, name) pairs; digest is None for legacy flat-folder uploads."""
+        files = []
+        for entry in (self.question_file or "").split(','):
+            if not entry:
+                continue
+            digest, sep, name = entry.partition(':')
+            if sep and len(digest) == 64:
+                files.append((digest, name))
+            else:
+                files.append((None, entry))
+        return files
+
+    @property
+    def question_file_labels(self):
+        """Display names, without the Q_<course>_<ts>_ prefix of legacy uploads."""
+        return [name if digest else name.split('_', 3)[-1] for digest, name in self.question_files]
+
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     
+    # Original upload name; the bytes live in the blob store under content_hash
     filename = db.Column(db.String(100))
     # CRITICAL: Stores the OCR/Extracted text for AI comparison
     text_content = db.Column(db.Text, nullable=True) 
@@ -59,3 +85,11 @@ class Submission(db.Model):
     
     # Standardized backref to 'author' to match logic in app.py
     author = db.relationship('User', backref=db.backref('submissions', lazy=True))
+
+class Blob(db.Model):
+    # Content-addressed file, shared by every Submission/Assignment that uploaded it
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0)
+    tier = db.Column(db.String(10), default='hot') # 'hot' (raw) or 'cold' (gzip)
+    last_used = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,209 @@
+# storage.py  (CONTENT-ADDRESSED BLOB STORE)
+
+import os
+import gzip
+import time
+import shutil
+import hashlib
+import tempfile
+import mimetypes
+from datetime import datetime
+
+from flask import current_app, request, send_file
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Blob
+
+
+HOT = "hot"
+COLD = "cold"
+CHUNK_SIZE = 1024 * 1024
+
+# Unreferenced files younger than this may belong to an in-flight upload
+SWEEP_GRACE_SECONDS = 60 * 60
+
+
+# -------------------------------------------------
+# PATHS
+# -------------------------------------------------
+def blob_path(digest, tier=HOT):
+    """blobs/<tier>/ab/cd/<digest> -- two shard levels keep directories small."""
+    root = current_app.config["BLOB_FOLDER"]
+    name = digest + ".gz" if tier == COLD else digest
+    return os.path.join(root, tier, digest[:2], digest[2:4], name)
+
+
+def _tmp_dir():
+    path = os.path.join(current_app.config["BLOB_FOLDER"], "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# -------------------------------------------------
+# WRITE
+# -------------------------------------------------
+def save_upload(stream):
+    """
+    Streams an upload to disk while hashing it and returns (digest, size).
+    Identical content is only ever written once. The file stays unreferenced
+    until retain() is committed; sweep() collects it otherwise.
+    """
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir())
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        digest = sha.hexdigest()
+        path = blob_path(digest)
+
+        if os.path.exists(path):
+            # Keep the existing copy out of sweep()'s reach while we use it
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return digest, size
+
+
+# -------------------------------------------------
+# REFERENCE COUNTING
+# -------------------------------------------------
+def retain(digest, size):
+    """
+    Adds a reference to a saved blob. Committed with the caller's session.
+    A single upsert, so concurrent uploads of the same bytes neither collide
+    on the primary key nor lose increments.
+    """
+    now = datetime.utcnow()
+
+    # Re-uploaded after archiving: the fresh hot copy makes it hot again.
+    # The old .gz is left for sweep() in case this transaction rolls back.
+    tier = HOT if os.path.exists(blob_path(digest)) else Blob.tier
+
+    stmt = insert(Blob).values(hash=digest, size=size, ref_count=1, tier=HOT, last_used=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.hash],
+        set_={"ref_count": Blob.ref_count + 1, "last_used": now, "tier": tier},
+    )
+    db.session.execute(stmt)
+
+
+def sweep(grace=SWEEP_GRACE_SECONDS):
+    """
+    Deletes files no committed reference points at: failed or rolled-back
+    uploads, superseded tier copies and stale temp files. Files newer than
+    `grace` seconds are kept so in-flight requests can still retain them.
+    """
+    root = current_app.config["BLOB_FOLDER"]
+    cutoff = time.time() - grace
+    live = {
+        blob_path(blob.hash, blob.tier)
+        for blob in Blob.query.filter(Blob.ref_count > 0).all()
+    }
+    removed = 0
+
+    for tier in (HOT, COLD, "tmp"):
+        for dirpath, _, names in os.walk(os.path.join(root, tier)):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                if path not in live and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+
+    Blob.query.filter(Blob.ref_count <= 0).delete()
+    db.session.commit()
+    return removed
+
+
+# -------------------------------------------------
+# COLD TIER
+# -------------------------------------------------
+def archive(before):
+    """
+    Gzips every hot blob not used since `before` (e.g. the start of term).
+    Files touched within the sweep grace may be mid-upload and are skipped.
+    """
+    moved = 0
+    grace_start = time.time() - SWEEP_GRACE_SECONDS
+
+    for blob in Blob.query.filter(Blob.tier == HOT, Blob.last_used < before).all():
+        hot_path = blob_path(blob.hash)
+        cold_path = blob_path(blob.hash, COLD)
+
+        if not os.path.exists(hot_path):
+            print(f"Skipping {blob.hash}: hot file is missing.")
+            continue
+        if os.path.getmtime(hot_path) > grace_start:
+            continue
+
+        os.makedirs(os.path.dirname(cold_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir())
+
+        try:
+            with os.fdopen(fd, "wb") as raw, open(hot_path, "rb") as src, \
+                    gzip.GzipFile(fileobj=raw, mode="wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+            # An upload may have reused the hot file while we compressed it
+            if os.path.getmtime(hot_path) > grace_start:
+                continue
+            os.replace(tmp_path, cold_path)
+        except FileNotFoundError:
+            print(f"Skipping {blob.hash}: hot file vanished while archiving.")
+            continue
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        blob.tier = COLD
+        db.session.commit()
+        os.remove(hot_path)
+        moved += 1
+
+    return moved
+
+
+# -------------------------------------------------
+# DOWNLOAD
+# -------------------------------------------------
+def send_blob(digest, download_name):
+    """
+    Serves a blob as an attachment. Paths go straight to send_file so the
+    WSGI server can use sendfile(); set USE_X_SENDFILE behind nginx/apache.
+    Cold blobs are sent still-compressed to clients that accept gzip.
+    """
+    blob = db.get_or_404(Blob, digest)
+    mimetype = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+
+    if blob.tier == HOT:
+        return send_file(blob_path(digest), mimetype=mimetype,
+                         as_attachment=True, download_name=download_name)
+
+    cold_path = blob_path(digest, COLD)
+
+    if "gzip" in request.accept_encodings:
+        response = send_file(cold_path, mimetype=mimetype,
+                             as_attachment=True, download_name=download_name)
+        response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    # GzipFile.fileno() is the compressed file, which a sendfile()-based
+    # file_wrapper would send raw; decompress into a real file instead.
+    plain = tempfile.TemporaryFile(dir=_tmp_dir())
+    with gzip.open(cold_path, "rb") as src:
+        shutil.copyfileobj(src, plain, CHUNK_SIZE)
+    plain.seek(0)
+
+    return send_file(plain, mimetype=mimetype,
+                     as_attachment=True, download_name=download_name)